@@ -4,81 +4,185 @@ ML-Based Engineering Drawing Review System
 Real Color Detection & Change Tracking
 """
 
-from flask import Flask, request, jsonify, send_file, session, redirect, url_for
+from flask import Flask, request, jsonify, send_file, session, redirect, url_for, g, has_request_context
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from werkzeug.security import check_password_hash
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 import hashlib
-from datetime import datetime
+from datetime import datetime, timedelta
 import secrets
 import io
+import mmap
+import gzip
+import re
+import contextlib
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from functools import lru_cache, wraps
+import threading
+import itertools
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from markupsafe import Markup, escape
+import pymupdf
+import orjson
+
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson, used by jsonify and request.json"""
+    
+    mimetype = 'application/json'
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype=self.mimetype)
+
 
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(32)
+# Shared across workers so any of them can read a session another one signed
+app.secret_key = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
+app.json = OrjsonProvider(app)
+
+# With Redis available, sessions live server-side and the cookie only holds their id.
+# Non-permanent sessions are only saved (and their cookie only sent) when they change,
+# so reads like check-session are a single Redis GET; the key still expires after
+# PERMANENT_SESSION_LIFETIME
+if os.environ.get('REDIS_URL'):
+    import redis
+    from flask_session import Session
+    
+    app.config.update(
+        SESSION_TYPE='redis',
+        SESSION_REDIS=redis.from_url(os.environ['REDIS_URL']),
+        SESSION_PERMANENT=False,
+        PERMANENT_SESSION_LIFETIME=timedelta(minutes=5)
+    )
+    Session(app)
 CORS(app)
 
+# Behind a proxy remote_addr is the proxy; PROXY_HOPS trusted hops of X-Forwarded-For
+# give the real client, so the login limit is per client. Left at 0 when the app is
+# reached directly, where the header would let any client pick its own address
+PROXY_HOPS = int(os.environ.get('PROXY_HOPS', 0))
+if PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS)
+
+# Limit counters are shared through Redis when available; the in-memory fallback is
+# per gunicorn worker, so there the effective limit is WEB_CONCURRENCY times the rule
+limiter = Limiter(get_remote_address, app=app,
+                  storage_uri=os.environ.get('REDIS_URL', 'memory://'))
+
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 REPORT_FOLDER = 'reports'
+RESULT_CACHE_FOLDER = os.path.join(REPORT_FOLDER, '.cache')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(REPORT_FOLDER, exist_ok=True)
+os.makedirs(RESULT_CACHE_FOLDER, exist_ok=True)
+app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # Largest accepted upload
+LOGIN_CACHE_SIZE = 256
+# Only the bundled demo accounts get their login checks memoized
+DEMO_MODE = os.environ.get('DEMO_MODE') == '1'
+
+# Login verdicts keyed by (username, sha256 of the attempted password)
+_LOGIN_CACHE = OrderedDict()
+_LOGIN_CACHE_LOCK = threading.Lock()
+
+# gunicorn worker count; each worker process gets its own analysis pool
+WEB_WORKERS = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+# CPU-bound scans run here so they don't serialize on one interpreter.
+# All cores but one are split between the gunicorn workers' pools, leaving
+# that core for the request threads. Workers come from a forkserver, not a
+# fork of this multithreaded process, so they can't inherit a lock some
+# request thread was holding
+ANALYSIS_POOL = ProcessPoolExecutor(
+    max_workers=max(1, (os.cpu_count() - 1) // WEB_WORKERS),
+    mp_context=multiprocessing.get_context('forkserver')
+)
+ANALYSIS_TIMEOUT = 120  # seconds a request waits on the pool
+USER_POOL_SLOTS = 2  # concurrent pool jobs per user
+
+# Per-user semaphores so one account can't occupy the whole pool
+_USER_SLOTS = {}
+_USER_SLOTS_LOCK = threading.Lock()
 
 # Users database (in production, use real database)
+# Passwords are stored pre-hashed so no KDF runs at import time
 USERS = {
     'engineer': {
-        'password': generate_password_hash('engineer123'),
+        'password': 'pbkdf2:sha256:600000$TA6Dgc0cRnUixgbp$b0a6f515475ad7e51b857a1d77ce9799ffdf57bd7afed17a9491d70bcbef2df8',
         'name': 'Senior Engineer',
         'role': 'engineer'
     },
     'designer': {
-        'password': generate_password_hash('designer123'),
+        'password': 'pbkdf2:sha256:600000$rSZC63Kqutm20N4V$bcd386e3be777c552a150866853b609371ebf43f59dc9cfdb8ca289e0f73df03',
         'name': 'Design Reviewer',
         'role': 'designer'
     }
 }
 
+# Line classifiers, compiled once and reused for every line
+DIM_RE = re.compile(r'MM|THK|X')
+SPEC_RE = re.compile(r'GRADE|STEEL|CONCRETE|REINFORCEMENT')
+MISSING_RE = re.compile(r' [dD]')
+KEYWORD_RE = re.compile(r'MM|THK|X|GRADE|STEEL|CONCRETE|REINFORCEMENT| [dD]')
+COLOR_DIM_RE = re.compile(r'[dD]|MM|THK')
+DIGIT_RE = re.compile(r'\d')
+
 # ==================== ML MODEL - COLOR DETECTION ====================
 
-def detect_colors_in_pdf(pdf_content):
+@dataclass(slots=True)
+class LineHit:
+    """A flagged piece of drawing text; detail holds e.g. the colour or font"""
+    line: int
+    text: str
+    type: str = ''
+    detail: str = ''
+
+
+def _iter_pdf_lines(doc, annotations):
     """
-    ML-based color detection in PDF
-    Detects: Red markups, bold text, annotations
+    Text lines of an open PDF, in reading order
+    Page annotations are collected into `annotations` on the same walk
+    Yields: (line_text, spans)
     """
-    # Simulated ML detection - In production, use computer vision
-    detected_changes = {
-        'red_markups': [],
-        'bold_changes': [],
-        'dimension_issues': [],
-        'annotations': []
-    }
-    
-    # Simulate detection based on text analysis
-    lines = pdf_content.split('\n')
-    
-    for line_num, line in enumerate(lines, 1):
-        # Detect dimensions
-        if any(dim in line for dim in ['d', 'D', 'MM', 'THK']):
-            if line.strip() and len(line.strip()) < 50:
-                detected_changes['dimension_issues'].append({
-                    'line': line_num,
-                    'text': line.strip(),
-                    'type': 'dimension'
-                })
-        
-        # Detect numbers that should be bold
-        if any(char.isdigit() for char in line):
-            detected_changes['bold_changes'].append({
-                'line': line_num,
-                'text': line.strip(),
-                'should_be_bold': True
+    for page in doc:
+        for annot in page.annots():
+            annotations.append({
+                'page': page.number + 1,
+                'text': annot.info.get('content', ''),
+                'type': annot.type[1]
             })
-    
-    return detected_changes
+        
+        for block in page.get_text('dict')['blocks']:
+            for pdf_line in block.get('lines', ()):
+                spans = pdf_line['spans']
+                yield ''.join(span['text'] for span in spans), spans
+
+
+def _is_red(color):
+    """sRGB integer from PyMuPDF is a red markup colour"""
+    return (color >> 16) & 0xFF >= 0xC0 and (color >> 8) & 0xFF < 0x40 and color & 0xFF < 0x40
 
 
-def analyze_pdf_content(pdf_content):
+def _scan_pdf(filepath):
     """
-    Comprehensive PDF content analysis
+    Single pass over the PDF text and styling
+    Takes the path of a stored upload; MuPDF reads the file itself
+    Returns: (analysis, detected_changes)
     """
     analysis = {
         'total_lines': 0,
@@ -89,90 +193,155 @@ def analyze_pdf_content(pdf_content):
         'quality_score': 0
     }
     
-    lines = [l for l in pdf_content.split('\n') if l.strip()]
-    analysis['total_lines'] = len(lines)
+    detected_changes = {
+        'red_markups': [],
+        'bold_changes': [],
+        'dimension_issues': [],
+        'markup_notes': [],
+        'annotations': []
+    }
     
-    for line in lines:
-        # Detect dimensions
-        if 'MM' in line or 'THK' in line or 'X' in line:
-            analysis['dimensions'].append(line.strip())
-        
-        # Detect specifications
-        if any(word in line for word in ['GRADE', 'STEEL', 'CONCRETE', 'REINFORCEMENT']):
-            analysis['specifications'].append(line.strip())
-        
-        # Detect notes
-        if line.strip().startswith(tuple('123456789')) or 'NOTE' in line:
-            analysis['notes'].append(line.strip())
-        
-        # Detect missing data (lowercase d, D without values)
-        if ' d' in line or ' D' in line:
-            if not any(char.isdigit() for char in line.split()[-1]):
-                analysis['missing_data'].append({
-                    'issue': 'Missing dimension value',
-                    'text': line.strip()
-                })
+    with pymupdf.open(filepath, filetype='pdf') as doc:
+        lines = _iter_pdf_lines(doc, detected_changes['annotations'])
+        for line_num, (line, spans) in enumerate(lines, 1):
+            text = line.strip()
+            if not text:
+                continue
+            
+            analysis['total_lines'] += 1
+            
+            # Detect notes
+            if text[0] in '123456789' or 'NOTE' in text:
+                analysis['notes'].append(text)
+            
+            # One combined search rules out lines no keyword classifier can match
+            if KEYWORD_RE.search(line):
+                # Detect dimensions
+                if DIM_RE.search(line):
+                    analysis['dimensions'].append(text)
+                
+                # Detect specifications
+                if SPEC_RE.search(line):
+                    analysis['specifications'].append(text)
+                
+                # Detect missing data (lowercase d, D without values)
+                if MISSING_RE.search(line):
+                    if not DIGIT_RE.search(line.split()[-1]):
+                        analysis['missing_data'].append({
+                            'issue': 'Missing dimension value',
+                            'text': text
+                        })
+            
+            # Detect dimension callouts
+            if COLOR_DIM_RE.search(line) and len(text) < 50:
+                detected_changes['dimension_issues'].append(LineHit(line_num, text, 'dimension'))
+            
+            # Detect red markups and numbers set in bold
+            for span in spans:
+                span_text = span['text'].strip()
+                if not span_text:
+                    continue
+                
+                if _is_red(span['color']):
+                    detected_changes['red_markups'].append(
+                        LineHit(line_num, span_text, 'red_markup', f"#{span['color']:06x}")
+                    )
+                
+                if span['flags'] & pymupdf.TEXT_FONT_BOLD and DIGIT_RE.search(span_text):
+                    detected_changes['bold_changes'].append(
+                        LineHit(line_num, span_text, 'bold', span['font'])
+                    )
+            
+            # Detect designer "Bold" markup notes
+            if 'Bold' in line:
+                detected_changes['markup_notes'].append(LineHit(line_num, text, 'bold_markup'))
+    
+    analysis['quality_score'] = _quality_score(
+        len(analysis['dimensions']),
+        len(analysis['specifications']),
+        len(analysis['notes']),
+        len(analysis['missing_data'])
+    )
     
-    # Calculate quality score
+    return analysis, detected_changes
+
+
+def _quality_score(dim_count, spec_count, note_count, missing_count):
+    """
+    Drawing quality score from classifier hit counts
+    """
     score = 50  # Base score
-    if len(analysis['dimensions']) > 10:
+    if dim_count > 10:
         score += 15
-    if len(analysis['specifications']) > 5:
+    if spec_count > 5:
         score += 15
-    if len(analysis['notes']) > 3:
+    if note_count > 3:
         score += 10
-    if len(analysis['missing_data']) == 0:
+    if missing_count == 0:
         score += 10
     
-    analysis['quality_score'] = min(100, score)
-    
-    return analysis
+    return min(100, score)
 
 
-def compare_pdfs_ml(before_content, after_content):
+def _content_hasher():
     """
-    ML-based PDF comparison
-    Detects: Color markups, bold text, dimensional changes
+    The one content hash used for uploads, caches and ETags
+    Feed it incrementally while data streams past, then take hexdigest()
     """
-    
-    # Check if files are identical
-    before_hash = hashlib.md5(before_content.encode()).hexdigest()
-    after_hash = hashlib.md5(after_content.encode()).hexdigest()
-    
-    if before_hash == after_hash:
-        return {
-            'identical': True,
-            'message': '⚠️ IDENTICAL FILES DETECTED',
-            'recommendation': 'BEFORE file should be ENGINEER COMMENTED version. AFTER file should be DESIGNER UPDATED version.',
-            'changes': []
-        }
-    
-    # Detect changes
-    before_analysis = analyze_pdf_content(before_content)
-    after_analysis = analyze_pdf_content(after_content)
-    
-    before_colors = detect_colors_in_pdf(before_content)
-    after_colors = detect_colors_in_pdf(after_content)
+    return hashlib.blake2b(digest_size=16)
+
+
+def _content_digest(data):
+    """
+    Content hash of bytes (or any buffer) that are already in memory
+    """
+    hasher = _content_hasher()
+    hasher.update(data)
+    return hasher.hexdigest()
+
+
+def _identical_result():
+    """
+    Result for two uploads with the same content
+    A fresh dict each call, so editing one response can't change later ones
+    """
+    return {
+        'identical': True,
+        'message': '⚠️ IDENTICAL FILES DETECTED',
+        'recommendation': 'BEFORE file should be ENGINEER COMMENTED version. AFTER file should be DESIGNER UPDATED version.',
+        'changes': []
+    }
+
+
+def compare_scans(before_scan, after_scan):
+    """
+    Change detection between two scanned files
+    Scans are the (analysis, detected_changes) pairs from _scan_pdf
+    """
+    before_analysis, before_colors = before_scan
+    after_analysis, after_colors = after_scan
     
     # Find specific changes
     changes = []
     
-    # Dimension changes
-    before_dims = set(before_analysis['dimensions'])
-    after_dims = set(after_analysis['dimensions'])
+    # Dimension changes (multiset diff so repeated dimensions are counted)
+    before_dims = Counter(before_analysis['dimensions'])
+    after_dims = Counter(after_analysis['dimensions'])
     
-    for dim in after_dims - before_dims:
+    for dim, count in (after_dims - before_dims).items():
         changes.append({
             'type': 'DIMENSION_ADDED',
             'description': f'New dimension: {dim}',
-            'severity': 'HIGH'
+            'severity': 'HIGH',
+            'count': count
         })
     
-    for dim in before_dims - after_dims:
+    for dim, count in (before_dims - after_dims).items():
         changes.append({
             'type': 'DIMENSION_REMOVED',
             'description': f'Removed dimension: {dim}',
-            'severity': 'MEDIUM'
+            'severity': 'MEDIUM',
+            'count': count
         })
     
     # Missing data resolution
@@ -186,15 +355,15 @@ def compare_pdfs_ml(before_content, after_content):
             'severity': 'GOOD'
         })
     
-    # Bold text detection (simulated)
-    if 'Bold' in after_content and 'Bold' not in before_content:
+    # Designer "Bold" markup notes
+    if after_colors['markup_notes'] and not before_colors['markup_notes']:
         changes.append({
             'type': 'MARKUP_DETECTED',
             'description': 'Designer markup: "Bold" annotation found',
             'severity': 'INFO'
         })
     
-    # Red markup simulation (based on your images)
+    # Bold formatting on numbers
     if len(after_colors['bold_changes']) > len(before_colors['bold_changes']):
         changes.append({
             'type': 'FORMATTING_CHANGE',
@@ -214,10 +383,44 @@ def compare_pdfs_ml(before_content, after_content):
 
 # ==================== ENGINEERING CHECKLIST ====================
 
+# Checklist for identical uploads, where there is no analysis to inspect
+def _identical_checklist():
+    """
+    Checklist for identical uploads, built as a literal rather than from the empty scan
+    A fresh dict each call, like _identical_result()
+    """
+    return {
+        'critical_items': [{
+            'status': 'PASS',
+            'item': 'All Dimensions Specified',
+            'details': 'No missing dimension values detected'
+        }],
+        'dimensions': [{
+            'status': 'WARNING',
+            'item': 'Limited Dimensions',
+            'details': 'Only 0 dimensions found'
+        }],
+        'specifications': [],
+        'annotations': [{
+            'status': 'FAIL',
+            'item': 'No Updates Detected',
+            'details': 'Files appear identical or no changes made'
+        }],
+        'completeness': [{
+            'status': 'WARNING',
+            'item': 'Drawing Needs Improvement',
+            'details': 'Quality Score: 0%'
+        }]
+    }
+
+
 def generate_engineering_checklist(analysis_result):
     """
     PE-Level Engineering Drawing Checklist
     """
+    if analysis_result.get('identical'):
+        return _identical_checklist()
+    
     checklist = {
         'critical_items': [],
         'dimensions': [],
@@ -303,231 +506,139 @@ def generate_engineering_checklist(analysis_result):
 
 # ==================== REPORT GENERATION ====================
 
-def generate_analysis_report(analysis_result, checklist):
-    """
-    Generate comprehensive HTML report
-    """
-    
-    changes_html = ""
-    if analysis_result.get('identical'):
-        changes_html = f"""
-        <div class="warning-box">
-            <h2>⚠️ IDENTICAL FILES DETECTED</h2>
-            <p><strong>{analysis_result['message']}</strong></p>
-            <p style="margin-top: 15px;">{analysis_result['recommendation']}</p>
-            <ul style="margin-top: 15px; text-align: left;">
-                <li><strong>BEFORE File:</strong> Should contain ENGINEER'S RED MARKUPS/COMMENTS</li>
-                <li><strong>AFTER File:</strong> Should contain DESIGNER'S UPDATES/REVISIONS</li>
-            </ul>
-        </div>
-        """
-    else:
-        changes_list = ""
-        for change in analysis_result.get('changes', []):
-            severity_class = {
-                'HIGH': 'badge-danger',
-                'MEDIUM': 'badge-warning',
-                'GOOD': 'badge-success',
-                'INFO': 'badge-info'
-            }.get(change['severity'], 'badge-secondary')
-            
-            changes_list += f"""
-            <tr>
-                <td>{change['type'].replace('_', ' ')}</td>
-                <td>{change['description']}</td>
-                <td><span class="badge {severity_class}">{change['severity']}</span></td>
-            </tr>
-            """
-        
-        changes_html = f"""
-        <h2>📊 Detected Changes: {analysis_result.get('total_changes', 0)}</h2>
-        <table>
-            <thead>
-                <tr>
-                    <th>Change Type</th>
-                    <th>Description</th>
-                    <th>Severity</th>
-                </tr>
-            </thead>
-            <tbody>
-                {changes_list}
-            </tbody>
-        </table>
-        """
-    
-    # Checklist HTML
-    checklist_html = ""
-    for category, items in checklist.items():
-        category_name = category.replace('_', ' ').title()
-        items_html = ""
-        
-        for item in items:
-            status_icon = {
-                'PASS': '✅',
-                'FAIL': '❌',
-                'WARNING': '⚠️'
-            }.get(item['status'], '•')
-            
-            items_html += f"""
-            <tr>
-                <td>{status_icon} {item['status']}</td>
-                <td>{item['item']}</td>
-                <td>{item['details']}</td>
-            </tr>
-            """
-        
-        checklist_html += f"""
-        <h3>{category_name}</h3>
-        <table>
-            <thead>
-                <tr>
-                    <th>Status</th>
-                    <th>Item</th>
-                    <th>Details</th>
-                </tr>
-            </thead>
-            <tbody>
-                {items_html}
-            </tbody>
-        </table>
-        """
-    
-    # Statistics
-    before = analysis_result.get('before_analysis', {})
-    after = analysis_result.get('after_analysis', {})
-    
-    html_report = f"""
+# Static report page, compiled once; only the dynamic bits are rendered per call
+REPORT_TEMPLATE = app.jinja_env.from_string("""
     <!DOCTYPE html>
     <html>
     <head>
         <meta charset="UTF-8">
         <title>Engineering Drawing Analysis Report</title>
         <style>
-            * {{ margin: 0; padding: 0; box-sizing: border-box; }}
+            * { margin: 0; padding: 0; box-sizing: border-box; }
             
-            body {{
+            body {
                 font-family: Arial, sans-serif;
                 line-height: 1.6;
                 color: #333;
                 background: #f5f5f5;
                 padding: 20px;
-            }}
+            }
             
-            .container {{
+            .container {
                 max-width: 1200px;
                 margin: 0 auto;
                 background: white;
                 padding: 40px;
                 box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-            }}
+            }
             
-            .header {{
+            .header {
                 text-align: center;
                 padding: 30px;
                 background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
                 color: white;
                 border-radius: 10px;
                 margin-bottom: 30px;
-            }}
+            }
             
-            .header h1 {{
+            .header h1 {
                 font-size: 32px;
                 margin-bottom: 10px;
-            }}
+            }
             
-            .warning-box {{
+            .warning-box {
                 background: #fff3cd;
                 border-left: 5px solid #ff9800;
                 padding: 20px;
                 margin: 20px 0;
                 border-radius: 5px;
-            }}
+            }
             
-            .stats-grid {{
+            .stats-grid {
                 display: grid;
                 grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
                 gap: 20px;
                 margin: 30px 0;
-            }}
+            }
             
-            .stat-box {{
+            .stat-box {
                 background: #f8f9fa;
                 padding: 20px;
                 border-radius: 10px;
                 text-align: center;
                 border: 2px solid #667eea;
-            }}
+            }
             
-            .stat-value {{
+            .stat-value {
                 font-size: 36px;
                 font-weight: bold;
                 color: #667eea;
                 margin: 10px 0;
-            }}
+            }
             
-            .stat-label {{
+            .stat-label {
                 font-size: 14px;
                 color: #666;
                 text-transform: uppercase;
-            }}
+            }
             
-            table {{
+            table {
                 width: 100%;
                 border-collapse: collapse;
                 margin: 20px 0;
                 background: white;
-            }}
+            }
             
-            th {{
+            th {
                 background: #667eea;
                 color: white;
                 padding: 12px;
                 text-align: left;
-            }}
+            }
             
-            td {{
+            td {
                 padding: 10px 12px;
                 border-bottom: 1px solid #ddd;
-            }}
+            }
             
-            tr:hover {{
+            tr:hover {
                 background: #f5f5f5;
-            }}
+            }
             
-            h2 {{
+            h2 {
                 color: #667eea;
                 margin: 30px 0 20px 0;
                 padding-bottom: 10px;
                 border-bottom: 2px solid #667eea;
-            }}
+            }
             
-            h3 {{
+            h3 {
                 color: #764ba2;
                 margin: 20px 0 10px 0;
-            }}
+            }
             
-            .badge {{
+            .badge {
                 display: inline-block;
                 padding: 5px 15px;
                 border-radius: 20px;
                 font-size: 12px;
                 font-weight: bold;
-            }}
+            }
             
-            .badge-success {{ background: #d4edda; color: #155724; }}
-            .badge-danger {{ background: #f8d7da; color: #721c24; }}
-            .badge-warning {{ background: #fff3cd; color: #856404; }}
-            .badge-info {{ background: #d1ecf1; color: #0c5460; }}
-            .badge-secondary {{ background: #e2e3e5; color: #383d41; }}
+            .badge-success { background: #d4edda; color: #155724; }
+            .badge-danger { background: #f8d7da; color: #721c24; }
+            .badge-warning { background: #fff3cd; color: #856404; }
+            .badge-info { background: #d1ecf1; color: #0c5460; }
+            .badge-secondary { background: #e2e3e5; color: #383d41; }
             
-            .footer {{
+            .footer {
                 margin-top: 50px;
                 padding-top: 20px;
                 border-top: 2px solid #667eea;
                 text-align: center;
                 color: #666;
                 font-size: 14px;
-            }}
+            }
         </style>
     </head>
     <body>
@@ -535,517 +646,491 @@ def generate_analysis_report(analysis_result, checklist):
             <div class="header">
                 <h1>🔍 NEXT GENERATION CODE ANALYSIS</h1>
                 <p>Engineering Drawing Review System - ML-Powered</p>
-                <p>Generated: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}</p>
+                <p>Generated: {{ generated }}</p>
             </div>
             
             <div class="stats-grid">
                 <div class="stat-box">
-                    <div class="stat-value">{before.get('quality_score', 0)}%</div>
+                    <div class="stat-value">{{ before.get('quality_score', 0) }}%</div>
                     <div class="stat-label">Before Quality</div>
                 </div>
                 <div class="stat-box">
-                    <div class="stat-value">{after.get('quality_score', 0)}%</div>
+                    <div class="stat-value">{{ after.get('quality_score', 0) }}%</div>
                     <div class="stat-label">After Quality</div>
                 </div>
                 <div class="stat-box">
-                    <div class="stat-value">{analysis_result.get('total_changes', 0)}</div>
+                    <div class="stat-value">{{ analysis.get('total_changes', 0) }}</div>
                     <div class="stat-label">Total Changes</div>
                 </div>
                 <div class="stat-box">
-                    <div class="stat-value">{analysis_result.get('quality_improvement', 0):+d}%</div>
+                    <div class="stat-value">{{ '%+d' % analysis.get('quality_improvement', 0) }}%</div>
                     <div class="stat-label">Improvement</div>
                 </div>
             </div>
             
-            {changes_html}
+            {{ changes_html }}
             
             <h2>✅ Engineering Checklist</h2>
-            {checklist_html}
+            {{ checklist_html }}
             
             <h2>📋 Detailed Analysis</h2>
             <h3>BEFORE File</h3>
             <ul>
-                <li><strong>Total Lines:</strong> {before.get('total_lines', 0)}</li>
-                <li><strong>Dimensions:</strong> {len(before.get('dimensions', []))}</li>
-                <li><strong>Specifications:</strong> {len(before.get('specifications', []))}</li>
-                <li><strong>Missing Data:</strong> {len(before.get('missing_data', []))}</li>
+                <li><strong>Total Lines:</strong> {{ before.get('total_lines', 0) }}</li>
+                <li><strong>Dimensions:</strong> {{ before.get('dimensions', [])|length }}</li>
+                <li><strong>Specifications:</strong> {{ before.get('specifications', [])|length }}</li>
+                <li><strong>Missing Data:</strong> {{ before.get('missing_data', [])|length }}</li>
             </ul>
             
             <h3>AFTER File</h3>
             <ul>
-                <li><strong>Total Lines:</strong> {after.get('total_lines', 0)}</li>
-                <li><strong>Dimensions:</strong> {len(after.get('dimensions', []))}</li>
-                <li><strong>Specifications:</strong> {len(after.get('specifications', []))}</li>
-                <li><strong>Missing Data:</strong> {len(after.get('missing_data', []))}</li>
+                <li><strong>Total Lines:</strong> {{ after.get('total_lines', 0) }}</li>
+                <li><strong>Dimensions:</strong> {{ after.get('dimensions', [])|length }}</li>
+                <li><strong>Specifications:</strong> {{ after.get('specifications', [])|length }}</li>
+                <li><strong>Missing Data:</strong> {{ after.get('missing_data', [])|length }}</li>
             </ul>
             
             <div class="footer">
                 <p><strong>NEXT GENERATION CODE ANALYSIS PLATFORM</strong></p>
-                <p>ML-Based Engineering Drawing Review | © {datetime.now().year}</p>
+                <p>ML-Based Engineering Drawing Review | © {{ year }}</p>
             </div>
         </div>
     </body>
     </html>
+""")
+
+# Read-only lookup tables shared by every report
+SEVERITY_CLASS = MappingProxyType({
+    'HIGH': 'badge-danger',
+    'MEDIUM': 'badge-warning',
+    'GOOD': 'badge-success',
+    'INFO': 'badge-info'
+})
+
+STATUS_ICON = MappingProxyType({
+    'PASS': '✅',
+    'FAIL': '❌',
+    'WARNING': '⚠️'
+})
+
+IDENTICAL_WARNING_TEMPLATE = """
+        <div class="warning-box">
+            <h2>⚠️ IDENTICAL FILES DETECTED</h2>
+            <p><strong>{message}</strong></p>
+            <p style="margin-top: 15px;">{recommendation}</p>
+            <ul style="margin-top: 15px; text-align: left;">
+                <li><strong>BEFORE File:</strong> Should contain ENGINEER'S RED MARKUPS/COMMENTS</li>
+                <li><strong>AFTER File:</strong> Should contain DESIGNER'S UPDATES/REVISIONS</li>
+            </ul>
+        </div>
+        """
+
+CHANGES_TABLE_TEMPLATE = """
+        <h2>📊 Detected Changes: {total_changes}</h2>
+        <table>
+            <thead>
+                <tr>
+                    <th>Change Type</th>
+                    <th>Description</th>
+                    <th>Severity</th>
+                </tr>
+            </thead>
+            <tbody>
+                {changes_list}
+            </tbody>
+        </table>
+        """
+
+CHANGE_ROW_TEMPLATE = """
+            <tr>
+                <td>{type}</td>
+                <td>{description}</td>
+                <td><span class="badge {severity_class}">{severity}</span></td>
+            </tr>
+            """
+
+CHECKLIST_ROW_TEMPLATE = """
+            <tr>
+                <td>{status_icon} {status}</td>
+                <td>{item}</td>
+                <td>{details}</td>
+            </tr>
+            """
+
+CHECKLIST_SECTION_TEMPLATE = """
+        <h3>{category_name}</h3>
+        <table>
+            <thead>
+                <tr>
+                    <th>Status</th>
+                    <th>Item</th>
+                    <th>Details</th>
+                </tr>
+            </thead>
+            <tbody>
+                {items_html}
+            </tbody>
+        </table>
+        """
+
+# [refreshed_at, formatted, year]; reports only show the time to the minute
+_REPORT_TS = [0.0, '', 0]
+
+
+def _report_timestamp():
+    """
+    Report header timestamp and footer year, refreshed at most once a minute
+    """
+    now = time.monotonic()
+    if not _REPORT_TS[1] or now - _REPORT_TS[0] >= 60:
+        dt = datetime.now()
+        _REPORT_TS[:] = [now, dt.strftime('%B %d, %Y at %I:%M %p'), dt.year]
+    return _REPORT_TS[1], _REPORT_TS[2]
+
+
+def generate_analysis_report(analysis_result, checklist):
+    """
+    Generate comprehensive HTML report
+    """
+    
+    if analysis_result.get('identical'):
+        changes_html = IDENTICAL_WARNING_TEMPLATE.format_map({
+            'message': escape(analysis_result['message']),
+            'recommendation': escape(analysis_result['recommendation'])
+        })
+    else:
+        changes_list = ''.join(
+            CHANGE_ROW_TEMPLATE.format_map({
+                'type': escape(change['type'].replace('_', ' ')),
+                'description': escape(change['description']),
+                'severity': escape(change['severity']),
+                'severity_class': SEVERITY_CLASS.get(change['severity'], 'badge-secondary')
+            })
+            for change in analysis_result.get('changes', [])
+        )
+        
+        changes_html = CHANGES_TABLE_TEMPLATE.format_map({
+            'total_changes': analysis_result.get('total_changes', 0),
+            'changes_list': changes_list
+        })
+    
+    # Checklist HTML
+    checklist_html = ''.join(
+        CHECKLIST_SECTION_TEMPLATE.format_map({
+            'category_name': escape(category.replace('_', ' ').title()),
+            'items_html': ''.join(
+                CHECKLIST_ROW_TEMPLATE.format_map({
+                    'status_icon': STATUS_ICON.get(item['status'], '•'),
+                    'status': escape(item['status']),
+                    'item': escape(item['item']),
+                    'details': escape(item['details'])
+                })
+                for item in items
+            )
+        })
+        for category, items in checklist.items()
+    )
+    
+    # Statistics
+    before = analysis_result.get('before_analysis', {})
+    after = analysis_result.get('after_analysis', {})
+    
+    generated, year = _report_timestamp()
+    
+    return REPORT_TEMPLATE.render(
+        analysis=analysis_result,
+        before=before,
+        after=after,
+        changes_html=Markup(changes_html),
+        checklist_html=Markup(checklist_html),
+        generated=generated,
+        year=year
+    )
+
+
+# ==================== UPLOAD STORAGE ====================
+
+# detected_changes lists holding LineHit records
+LINE_HIT_KEYS = ('red_markups', 'bold_changes', 'dimension_issues', 'markup_notes')
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Uploads are stored as <content hash>.pdf; this maps their original names to the hash
+UPLOAD_MANIFEST = os.path.join(UPLOAD_FOLDER, 'manifest.jsonl')
+
+# Sequence for stored file names; the pid keeps gunicorn workers apart
+_STAMP_COUNTER = itertools.count()
+# [second, formatted]; the wall-clock prefix only changes once a second
+_STAMP_PREFIX = [0, '']
+
+
+def _stamp():
+    """
+    Unique, time-ordered suffix for report and temporary file names
+    Two requests in the same second no longer overwrite each other's files
+    """
+    now = int(time.time())
+    if now != _STAMP_PREFIX[0]:
+        _STAMP_PREFIX[:] = [now, time.strftime('%Y%m%d_%H%M%S', time.localtime(now))]
+    return f"{_STAMP_PREFIX[1]}_{os.getpid()}_{next(_STAMP_COUNTER):06d}"
+
+
+def _write_atomic(path, data):
+    """
+    Write bytes to a private temporary file, then rename it over path
+    Readers in any worker see either the old file or the complete new one
+    """
+    tmp_path = f'{path}.{_stamp()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        # open() may itself have failed; don't mask that error
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+
+
+def _pool_result(fn, *args):
+    """
+    Run fn in ANALYSIS_POOL and wait up to ANALYSIS_TIMEOUT for its result
+    An overrunning job is cancelled if it hasn't started; one already running
+    is handed to per_user_limit, which keeps the user's slot until it ends
+    Raises: TimeoutError on overrun, or whatever fn raised
     """
+    future = ANALYSIS_POOL.submit(fn, *args)
+    try:
+        return future.result(timeout=ANALYSIS_TIMEOUT)
+    except TimeoutError:
+        if not future.cancel() and has_request_context():
+            g.overrun_job = future
+        raise
+
+
+def _save_scan(filepath, digest, scan):
+    """
+    Persist a file's scan next to it so analysis never reopens the PDF
+    Written atomically: an existing sidecar is always complete
+    """
+    analysis, detected_changes = scan
+    _write_atomic(filepath + '.json', orjson.dumps({
+        'digest': digest,
+        'analysis': analysis,
+        'detected_changes': detected_changes
+    }))
+
+
+def _record_upload(filename, file_type, original_name):
+    """
+    Append an upload to the manifest; one small append per line keeps workers from interleaving
+    """
+    with open(UPLOAD_MANIFEST, 'ab') as f:
+        f.write(orjson.dumps({
+            'filename': filename,
+            'original_name': original_name,
+            'type': file_type,
+            'uploaded': datetime.now().isoformat(timespec='seconds')
+        }) + b'\n')
+
+
+def _store_upload(file_type, original_name, stream):
+    """
+    Write an upload to disk chunk by chunk, hashing as it goes, then scan it
+    The body is never held in memory as a whole
+    Content already stored under its hash is reused without rescanning
+    Returns: (stored filename, size in bytes)
+    Raises: pymupdf.FileDataError if the content is not a readable PDF,
+            TimeoutError if the scan takes longer than ANALYSIS_TIMEOUT
+    """
+    partial_path = os.path.join(UPLOAD_FOLDER, f'.{_stamp()}.part')
+    digest = _content_hasher()
+    size = 0
     
-    return html_report
+    # A dropped connection, an oversized body or a failed scan must not leave the part file behind
+    try:
+        with open(partial_path, 'wb', buffering=1 << 20) as f:
+            while chunk := stream.read(UPLOAD_CHUNK_SIZE):
+                size += f.write(chunk)
+                digest.update(chunk)
+        
+        digest = digest.hexdigest()
+        filename = f'{digest}.pdf'
+        filepath = os.path.join(UPLOAD_FOLDER, filename)
+        
+        # The stored scan is renamed into place after the PDF, so its presence means
+        # a complete earlier upload
+        already_stored = os.path.exists(filepath + '.json')
+        if not already_stored:
+            # Extract and scan once here; analyze() only reads the stored result
+            scan = _pool_result(_scan_pdf, partial_path)
+    except BaseException:
+        # open() may itself have failed; don't mask that error
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(partial_path)
+        raise
+    
+    if already_stored:
+        os.remove(partial_path)
+    else:
+        os.replace(partial_path, filepath)
+        _save_scan(filepath, digest, scan)
+    
+    _record_upload(filename, file_type, original_name)
+    return filename, size
+
+
+def _is_upload_name(filename):
+    """
+    True for the bare name of a stored PDF in UPLOAD_FOLDER
+    Paths, hidden/partial files and non-PDFs are refused
+    """
+    return (
+        isinstance(filename, str)
+        and os.path.basename(filename) == filename
+        and not filename.startswith('.')
+        and filename.endswith('.pdf')
+    )
+
+
+def _load_scan(filename):
+    """
+    Stored scan of an uploaded file
+    PDFs uploaded before scans were stored are scanned once here
+    Returns: (digest, (analysis, detected_changes))
+    Raises: ValueError if filename is not a bare upload name
+    """
+    # The fallback scan writes a sidecar, so the name must not leave UPLOAD_FOLDER
+    if not _is_upload_name(filename):
+        raise ValueError(f'Invalid upload name: {filename!r}')
+    
+    filepath = os.path.join(UPLOAD_FOLDER, filename)
+    return _read_scan(filepath, os.stat(filepath).st_mtime_ns)
+
+
+@lru_cache(maxsize=256)
+def _read_scan(filepath, mtime_ns):
+    """
+    Memoized by path and modification time, so a replaced file is reread
+    """
+    try:
+        with open(filepath + '.json', 'rb') as f:
+            stored = orjson.loads(f.read())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        # Missing or unreadable stored scan: rebuild it from the PDF.
+        # Hash through a read-only mapping and let MuPDF read the file itself,
+        # so the PDF is never copied into this process's memory
+        with open(filepath, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            digest = _content_digest(mm)
+        scan = _pool_result(_scan_pdf, filepath)
+        _save_scan(filepath, digest, scan)
+        return digest, scan
+    
+    detected_changes = stored['detected_changes']
+    for key in LINE_HIT_KEYS:
+        detected_changes[key] = [LineHit(**hit) for hit in detected_changes[key]]
+    
+    return stored['digest'], (stored['analysis'], detected_changes)
+
+
+def _result_cache_path(before_digest, after_digest):
+    """
+    Where the analysis of one before/after content pair is remembered
+    """
+    return os.path.join(RESULT_CACHE_FOLDER, f'{before_digest}_{after_digest}.json')
 
 
 # ==================== API ROUTES ====================
 
+# Landing page read and compressed once at startup and served from memory.
+# static/index.html.gz for a reverse proxy is produced by the build step instead
+with open(os.path.join(app.static_folder, 'index.html'), 'rb') as f:
+    LANDING_HTML_BYTES = f.read()
+LANDING_HTML_GZIP = gzip.compress(LANDING_HTML_BYTES, compresslevel=9, mtime=0)
+LANDING_HTML_ETAG = _content_digest(LANDING_HTML_BYTES)
+
+
+# Fixed JSON bodies serialized once; each request still gets its own Response,
+# since CORS and session handling add headers to it
+HEALTH_BYTES = orjson.dumps({
+    'status': 'healthy',
+    'version': '3.0.0 - ML Edition',
+    'features': [
+        'Color Detection',
+        'Bold Text Analysis',
+        'Dimension Tracking',
+        'Engineering Checklist',
+        'ML-Based Comparison'
+    ]
+})
+SUCCESS_BYTES = orjson.dumps({'success': True})
+
+
 @app.route('/')
 def index():
     """Serve ultra-premium main application"""
-    return '''
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>CMT NEXUS - Next-Level Code Analysis</title>
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        
-        body {
-            font-family: 'Arial', sans-serif;
-            background: #0a0a0f;
-            color: white;
-            overflow-x: hidden;
-        }
-        
-        /* Stars Background */
-        .stars {
-            position: fixed;
-            top: 0;
-            left: 0;
-            width: 100%;
-            height: 100%;
-            pointer-events: none;
-        }
-        
-        .star {
-            position: absolute;
-            width: 2px;
-            height: 2px;
-            background: white;
-            border-radius: 50%;
-            animation: twinkle 3s infinite;
-        }
-        
-        @keyframes twinkle {
-            0%, 100% { opacity: 0.3; }
-            50% { opacity: 1; }
-        }
-        
-        /* Navigation */
-        nav {
-            position: fixed;
-            top: 0;
-            width: 100%;
-            padding: 30px 60px;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            z-index: 1000;
-            background: rgba(10, 10, 15, 0.8);
-            backdrop-filter: blur(10px);
-        }
-        
-        .logo {
-            font-size: 28px;
-            font-weight: bold;
-        }
-        
-        .logo span:first-child {
-            color: #00f0ff;
-        }
-        
-        .logo span:last-child {
-            background: linear-gradient(90deg, #b967ff, #ff006e);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-        }
-        
-        .nav-links {
-            display: flex;
-            gap: 40px;
-        }
-        
-        .nav-links a {
-            color: white;
-            text-decoration: none;
-            font-size: 14px;
-            font-weight: 600;
-            letter-spacing: 1px;
-            transition: color 0.3s;
-        }
-        
-        .nav-links a:hover {
-            color: #00f0ff;
-        }
-        
-        /* Hero Section */
-        .hero {
-            min-height: 100vh;
-            display: flex;
-            flex-direction: column;
-            justify-content: center;
-            align-items: center;
-            padding: 0 20px;
-            position: relative;
-        }
-        
-        .hero-title {
-            font-size: clamp(60px, 10vw, 120px);
-            font-weight: 900;
-            text-align: center;
-            line-height: 1.1;
-            margin-bottom: 40px;
-            background: linear-gradient(90deg, #00f0ff, #b967ff, #ff006e, #00f0ff);
-            background-size: 200% auto;
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            animation: gradientFlow 3s linear infinite;
-        }
-        
-        @keyframes gradientFlow {
-            0% { background-position: 0% center; }
-            100% { background-position: 200% center; }
-        }
-        
-        .hero-subtitle {
-            font-size: clamp(16px, 3vw, 24px);
-            color: #888;
-            text-align: center;
-            letter-spacing: 4px;
-            margin-bottom: 60px;
-            text-transform: uppercase;
-        }
-        
-        .cta-buttons {
-            display: flex;
-            gap: 30px;
-            flex-wrap: wrap;
-            justify-content: center;
-        }
-        
-        .cta-button {
-            padding: 18px 50px;
-            font-size: 16px;
-            font-weight: 700;
-            text-decoration: none;
-            border-radius: 50px;
-            transition: all 0.3s;
-            cursor: pointer;
-            border: none;
-            text-transform: uppercase;
-            letter-spacing: 1px;
-        }
-        
-        .cta-primary {
-            background: linear-gradient(90deg, #00f0ff, #b967ff);
-            color: #0a0a0f;
-            box-shadow: 0 0 30px rgba(0, 240, 255, 0.5);
-        }
-        
-        .cta-primary:hover {
-            transform: translateY(-3px);
-            box-shadow: 0 0 50px rgba(0, 240, 255, 0.8);
-        }
-        
-        .cta-secondary {
-            background: transparent;
-            color: #ff006e;
-            border: 2px solid #ff006e;
-        }
-        
-        .cta-secondary:hover {
-            background: #ff006e;
-            color: white;
-            transform: translateY(-3px);
-        }
-        
-        /* Features Section */
-        .features {
-            padding: 100px 20px;
-            background: rgba(20, 20, 30, 0.5);
-        }
-        
-        .features-grid {
-            max-width: 1200px;
-            margin: 0 auto;
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(280px, 1fr));
-            gap: 40px;
-        }
-        
-        .feature-card {
-            padding: 40px;
-            background: rgba(255, 255, 255, 0.05);
-            border: 1px solid rgba(255, 255, 255, 0.1);
-            border-radius: 20px;
-            transition: all 0.3s;
-        }
-        
-        .feature-card:hover {
-            transform: translateY(-10px);
-            background: rgba(255, 255, 255, 0.08);
-            border-color: #00f0ff;
-            box-shadow: 0 20px 40px rgba(0, 240, 255, 0.2);
-        }
-        
-        .feature-icon {
-            font-size: 48px;
-            margin-bottom: 20px;
-        }
-        
-        .feature-title {
-            font-size: 24px;
-            font-weight: 700;
-            margin-bottom: 15px;
-            color: #00f0ff;
-        }
-        
-        .feature-description {
-            color: #aaa;
-            line-height: 1.6;
-        }
-        
-        /* Modal */
-        .modal {
-            display: none;
-            position: fixed;
-            top: 0;
-            left: 0;
-            width: 100%;
-            height: 100%;
-            background: rgba(0, 0, 0, 0.9);
-            z-index: 2000;
-            align-items: center;
-            justify-content: center;
-        }
-        
-        .modal.active {
-            display: flex;
-        }
-        
-        .modal-content {
-            background: #1a1a2e;
-            padding: 50px;
-            border-radius: 20px;
-            max-width: 500px;
-            width: 90%;
-            border: 1px solid rgba(0, 240, 255, 0.3);
-        }
-        
-        .modal h2 {
-            color: #00f0ff;
-            margin-bottom: 30px;
-            font-size: 32px;
-        }
-        
-        .form-group {
-            margin-bottom: 25px;
-        }
-        
-        .form-group label {
-            display: block;
-            margin-bottom: 10px;
-            color: #aaa;
-            font-size: 14px;
-        }
-        
-        .form-group input {
-            width: 100%;
-            padding: 15px;
-            background: rgba(255, 255, 255, 0.05);
-            border: 1px solid rgba(255, 255, 255, 0.1);
-            border-radius: 10px;
-            color: white;
-            font-size: 16px;
-        }
-        
-        .form-group input:focus {
-            outline: none;
-            border-color: #00f0ff;
-        }
-        
-        .close-modal {
-            float: right;
-            font-size: 32px;
-            cursor: pointer;
-            color: #888;
-        }
-        
-        .close-modal:hover {
-            color: #ff006e;
-        }
-    </style>
-</head>
-<body>
-    <!-- Stars Background -->
-    <div class="stars" id="stars"></div>
-    
-    <!-- Navigation -->
-    <nav>
-        <div class="logo">
-            <span>CMT</span> <span>NEXUS</span>
-        </div>
-        <div class="nav-links">
-            <a href="#home">HOME</a>
-            <a href="#features">ANALYZE</a>
-            <a href="#" onclick="showLogin()">LOGIN</a>
-        </div>
-    </nav>
-    
-    <!-- Hero Section -->
-    <section class="hero" id="home">
-        <h1 class="hero-title">NEXT-LEVEL<br>CODE ANALYSIS</h1>
-        <p class="hero-subtitle">AI-POWERED • REAL-TIME • BLAZING FAST</p>
-        <div class="cta-buttons">
-            <a href="#upload" class="cta-button cta-primary" onclick="showUpload()">START NOW</a>
-            <a href="#" class="cta-button cta-secondary" onclick="showLogin()">SIGN IN</a>
-        </div>
-    </section>
-    
-    <!-- Features Section -->
-    <section class="features" id="features">
-        <div class="features-grid">
-            <div class="feature-card">
-                <div class="feature-icon">🔍</div>
-                <h3 class="feature-title">Color Detection</h3>
-                <p class="feature-description">Advanced ML algorithms detect red markups, annotations, and highlighted changes in engineering drawings.</p>
-            </div>
-            <div class="feature-card">
-                <div class="feature-icon">📊</div>
-                <h3 class="feature-title">Real-Time Analysis</h3>
-                <p class="feature-description">Instant comparison of BEFORE and AFTER PDFs with comprehensive change tracking.</p>
-            </div>
-            <div class="feature-card">
-                <div class="feature-icon">✅</div>
-                <h3 class="feature-title">Engineering Checklist</h3>
-                <p class="feature-description">PE-level verification ensuring all dimensions, specifications, and standards are met.</p>
-            </div>
-            <div class="feature-card">
-                <div class="feature-icon">📥</div>
-                <h3 class="feature-title">Professional Reports</h3>
-                <p class="feature-description">Download comprehensive analysis reports in HTML or PDF format.</p>
-            </div>
-            <div class="feature-card">
-                <div class="feature-icon">🎯</div>
-                <h3 class="feature-title">Dimension Tracking</h3>
-                <p class="feature-description">Automatically detect missing dimensions and formatting issues in technical drawings.</p>
-            </div>
-            <div class="feature-card">
-                <div class="feature-icon">⚡</div>
-                <h3 class="feature-title">Lightning Fast</h3>
-                <p class="feature-description">Process large engineering drawings in seconds with our optimized ML engine.</p>
-            </div>
-        </div>
-    </section>
-    
-    <!-- Login Modal -->
-    <div class="modal" id="loginModal">
-        <div class="modal-content">
-            <span class="close-modal" onclick="closeLogin()">&times;</span>
-            <h2>Sign In</h2>
-            <form id="loginForm">
-                <div class="form-group">
-                    <label>Username</label>
-                    <input type="text" id="username" placeholder="engineer" required>
-                </div>
-                <div class="form-group">
-                    <label>Password</label>
-                    <input type="password" id="password" placeholder="••••••••" required>
-                </div>
-                <button type="submit" class="cta-button cta-primary" style="width: 100%">Login</button>
-            </form>
-            <p style="margin-top: 20px; color: #666; font-size: 14px;">
-                Demo: engineer/engineer123 or designer/designer123
-            </p>
-        </div>
-    </div>
-    
-    <script>
-        // Generate stars
-        function generateStars() {
-            const starsContainer = document.getElementById('stars');
-            for (let i = 0; i < 100; i++) {
-                const star = document.createElement('div');
-                star.className = 'star';
-                star.style.left = Math.random() * 100 + '%';
-                star.style.top = Math.random() * 100 + '%';
-                star.style.animationDelay = Math.random() * 3 + 's';
-                starsContainer.appendChild(star);
-            }
-        }
-        
-        generateStars();
-        
-        // Modal functions
-        function showLogin() {
-            document.getElementById('loginModal').classList.add('active');
-        }
-        
-        function closeLogin() {
-            document.getElementById('loginModal').classList.remove('active');
-        }
-        
-        function showUpload() {
-            alert('Upload feature: Use API endpoint POST /api/upload\\n\\nOr integrate with frontend framework for full UI.');
-        }
-        
-        // Login form
-        document.getElementById('loginForm').addEventListener('submit', async (e) => {
-            e.preventDefault();
-            const username = document.getElementById('username').value;
-            const password = document.getElementById('password').value;
-            
-            try {
-                const response = await fetch('/api/login', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ username, password })
-                });
-                
-                const data = await response.json();
-                
-                if (data.success) {
-                    alert('Login successful! Welcome, ' + data.user.name);
-                    closeLogin();
-                } else {
-                    alert('Login failed: ' + data.message);
-                }
-            } catch (error) {
-                alert('Error: ' + error.message);
-            }
-        });
-        
-        // Close modal on outside click
-        window.onclick = function(event) {
-            const modal = document.getElementById('loginModal');
-            if (event.target === modal) {
-                closeLogin();
-            }
-        }
-    </script>
-</body>
-</html>
-    '''
+    if 'gzip' in request.accept_encodings:
+        response = app.response_class(LANDING_HTML_GZIP, mimetype='text/html')
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(LANDING_HTML_ETAG + '-gzip')
+    else:
+        response = app.response_class(LANDING_HTML_BYTES, mimetype='text/html')
+        response.set_etag(LANDING_HTML_ETAG)
+    
+    response.vary.add('Accept-Encoding')
+    return response.make_conditional(request)
+
+
+@app.after_request
+def cache_static(response):
+    """Let browsers and proxies cache static assets"""
+    if request.path == '/' or request.path.startswith(app.static_url_path + '/'):
+        # The session cookie is attached after this hook runs, so a response
+        # that will carry one is kept out of shared caches here
+        if session.modified:
+            response.headers['Cache-Control'] = 'private, no-cache'
+        else:
+            response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+
+def _check_credentials(username, password):
+    """
+    Password check that runs the KDF once per distinct attempt
+    Only a SHA-256 of the password is kept as the cache key
+    Outside DEMO_MODE every attempt runs the KDF
+    """
+    if username not in USERS or not password:
+        return False
+    
+    if not DEMO_MODE:
+        return check_password_hash(USERS[username]['password'], password)
+    
+    key = (username, hashlib.sha256(password.encode('utf-8')).hexdigest())
+    with _LOGIN_CACHE_LOCK:
+        verdict = _LOGIN_CACHE.get(key)
+        if verdict is not None:
+            _LOGIN_CACHE.move_to_end(key)
+            return verdict
+    
+    verdict = check_password_hash(USERS[username]['password'], password)
+    
+    with _LOGIN_CACHE_LOCK:
+        _LOGIN_CACHE[key] = verdict
+        if len(_LOGIN_CACHE) > LOGIN_CACHE_SIZE:
+            _LOGIN_CACHE.popitem(last=False)
+    
+    return verdict
 
 
 @app.route('/api/login', methods=['POST'])
+@limiter.limit('5 per minute')
 def login():
     """User authentication"""
     data = request.json
     username = data.get('username')
     password = data.get('password')
     
-    if username in USERS and check_password_hash(USERS[username]['password'], password):
+    if _check_credentials(username, password):
         session['user'] = username
         session['name'] = USERS[username]['name']
         session['role'] = USERS[username]['role']
@@ -1066,7 +1151,7 @@ def login():
 def logout():
     """User logout"""
     session.clear()
-    return jsonify({'success': True})
+    return app.response_class(SUCCESS_BYTES, mimetype='application/json')
 
 
 @app.route('/api/check-session', methods=['GET'])
@@ -1084,9 +1169,49 @@ def check_session():
     return jsonify({'logged_in': False})
 
 
+def _user_slot(username):
+    """
+    Semaphore bounding how many pool jobs one user can have in flight
+    """
+    with _USER_SLOTS_LOCK:
+        slot = _USER_SLOTS.get(username)
+        if slot is None:
+            slot = _USER_SLOTS[username] = threading.BoundedSemaphore(USER_POOL_SLOTS)
+    return slot
+
+
+def per_user_limit(view):
+    """
+    Reject a request with 429 while the user already has USER_POOL_SLOTS jobs running
+    A job that outlived its request holds the slot until it finishes
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if 'user' not in session:
+            return view(*args, **kwargs)
+        
+        slot = _user_slot(session['user'])
+        if not slot.acquire(blocking=False):
+            return jsonify({
+                'success': False,
+                'message': 'Too many analyses in progress, try again shortly'
+            }), 429
+        try:
+            return view(*args, **kwargs)
+        finally:
+            overrun_job = g.pop('overrun_job', None)
+            if overrun_job is None:
+                slot.release()
+            else:
+                overrun_job.add_done_callback(lambda _: slot.release())
+    
+    return wrapper
+
+
 @app.route('/api/upload', methods=['POST'])
+@per_user_limit
 def upload():
-    """Handle PDF upload"""
+    """Handle PDF upload from the multipart form"""
     if 'user' not in session:
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
     
@@ -1099,24 +1224,52 @@ def upload():
     if not file.filename.endswith('.pdf'):
         return jsonify({'success': False, 'message': 'Only PDF files allowed'}), 400
     
-    filename = f"{file_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(filepath)
+    try:
+        filename, size = _store_upload(file_type, file.filename, file.stream)
+    except pymupdf.FileDataError:
+        return jsonify({'success': False, 'message': 'File is not a readable PDF'}), 400
+    except TimeoutError:
+        return jsonify({'success': False, 'message': 'PDF took too long to process'}), 504
+    
+    return jsonify({
+        'success': True,
+        'filename': filename,
+        'size': size
+    })
+
+
+@app.route('/api/upload-stream', methods=['POST'])
+@per_user_limit
+def upload_stream():
+    """Handle raw PDF upload streamed as the request body"""
+    if 'user' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+    
+    original_name = os.path.basename(request.headers.get('X-Filename', ''))
+    file_type = request.headers.get('X-File-Type')
+    
+    if not original_name:
+        return jsonify({'success': False, 'message': 'No file uploaded'}), 400
+    
+    if not original_name.endswith('.pdf'):
+        return jsonify({'success': False, 'message': 'Only PDF files allowed'}), 400
     
-    # Read content for analysis
     try:
-        content = file.read().decode('utf-8', errors='ignore')
-    except:
-        content = ""
+        filename, size = _store_upload(file_type, original_name, request.stream)
+    except pymupdf.FileDataError:
+        return jsonify({'success': False, 'message': 'File is not a readable PDF'}), 400
+    except TimeoutError:
+        return jsonify({'success': False, 'message': 'PDF took too long to process'}), 504
     
     return jsonify({
         'success': True,
         'filename': filename,
-        'size': os.path.getsize(filepath)
+        'size': size
     })
 
 
 @app.route('/api/analyze', methods=['POST'])
+@per_user_limit
 def analyze():
     """Perform ML-based analysis"""
     if 'user' not in session:
@@ -1126,16 +1279,39 @@ def analyze():
     before_file = data.get('before_file')
     after_file = data.get('after_file')
     
+    if not (_is_upload_name(before_file) and _is_upload_name(after_file)):
+        return jsonify({'success': False, 'message': 'Invalid file name'}), 400
+    
     try:
-        # Read PDF contents
-        with open(os.path.join(UPLOAD_FOLDER, before_file), 'rb') as f:
-            before_content = f.read().decode('utf-8', errors='ignore')
+        # Load the scans stored at upload time; the same file twice is loaded once
+        before_digest, before_scan = _load_scan(before_file)
+        if after_file == before_file:
+            after_digest, after_scan = before_digest, before_scan
+        else:
+            after_digest, after_scan = _load_scan(after_file)
         
-        with open(os.path.join(UPLOAD_FOLDER, after_file), 'rb') as f:
-            after_content = f.read().decode('utf-8', errors='ignore')
+        # Reuse the result and report of an earlier identical submission
+        cache_path = _result_cache_path(before_digest, after_digest)
+        try:
+            with open(cache_path, 'rb') as f:
+                cached = orjson.loads(f.read())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            cached = None
+        
+        if cached and os.path.exists(os.path.join(REPORT_FOLDER, cached['report_filename'])):
+            return jsonify({
+                'success': True,
+                'analysis': cached['analysis'],
+                'checklist': generate_engineering_checklist(cached['analysis']),
+                'report_url': f"/download/{cached['report_filename']}",
+                'report_filename': cached['report_filename']
+            })
         
-        # Perform ML analysis
-        analysis_result = compare_pdfs_ml(before_content, after_content)
+        # Perform ML analysis; matching upload-time hashes need no comparison
+        if before_digest == after_digest:
+            analysis_result = _identical_result()
+        else:
+            analysis_result = compare_scans(before_scan, after_scan)
         
         # Generate checklist
         checklist = generate_engineering_checklist(analysis_result)
@@ -1144,11 +1320,21 @@ def analyze():
         report_html = generate_analysis_report(analysis_result, checklist)
         
         # Save report
-        report_filename = f"Analysis_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
+        report_filename = f"Analysis_Report_{_stamp()}.html"
         report_path = os.path.join(REPORT_FOLDER, report_filename)
         
-        with open(report_path, 'w', encoding='utf-8') as f:
-            f.write(report_html)
+        # Encoded once and reused for the .gz; both files are served as immutable,
+        # so they only appear once fully written
+        report_bytes = report_html.encode('utf-8')
+        _write_atomic(report_path, report_bytes)
+        
+        # Compressed once here so neither download() nor a proxy gzips it per request
+        _write_atomic(report_path + '.gz', gzip.compress(report_bytes, compresslevel=6))
+        
+        _write_atomic(cache_path, orjson.dumps({
+            'analysis': analysis_result,
+            'report_filename': report_filename
+        }))
         
         return jsonify({
             'success': True,
@@ -1169,25 +1355,32 @@ def analyze():
 def download(filename):
     """Download report"""
     filepath = os.path.join(REPORT_FOLDER, filename)
-    if os.path.exists(filepath):
-        return send_file(filepath, as_attachment=True, download_name=filename)
+    variants = [(filepath, None)]
+    if 'gzip' in request.accept_encodings:
+        variants.insert(0, (filepath + '.gz', 'gzip'))
+    
+    for path, encoding in variants:
+        try:
+            response = send_file(path, mimetype='text/html', as_attachment=True,
+                                 download_name=filename, conditional=True, etag=True,
+                                 max_age=86400)
+        except FileNotFoundError:
+            continue
+        
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        # Reports never change once written, so revalidation can answer 304
+        response.headers['Cache-Control'] = 'private, max-age=86400, immutable'
+        return response
+    
     return jsonify({'error': 'File not found'}), 404
 
 
 @app.route('/health')
 def health():
     """Health check"""
-    return jsonify({
-        'status': 'healthy',
-        'version': '3.0.0 - ML Edition',
-        'features': [
-            'Color Detection',
-            'Bold Text Analysis',
-            'Dimension Tracking',
-            'Engineering Checklist',
-            'ML-Based Comparison'
-        ]
-    })
+    return app.response_class(HEALTH_BYTES, mimetype='application/json')
 
 
 if __name__ == '__main__':